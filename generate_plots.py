@@ -1,8 +1,12 @@
 import pandas as pd
 import numpy as np
+import matplotlib
+matplotlib.use('Agg') # Plots are only saved to disk; skip loading a GUI backend
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 
 # --- Configuration ---
 OUTPUT_DIR = 'extended_results/plots'
@@ -10,6 +14,7 @@ INPUT_DIR = 'results'
 FILE_PATH = os.path.join(INPUT_DIR, 'extended_experiment_results.csv')
 GLOBAL_FIGSIZE = (20, 10) # Bigger figure size for better resolution and clarity
 DPI = 300 # Set a higher DPI for saving plots
+SCATTER_MAX_POINTS_PER_GROUP = 2000 # Points drawn per (dataset, transform) group in scatter plots
 
 # --- Consistent Color/Order Definitions ---
 # Use these to ensure colors and order are the same across all plots
@@ -21,27 +26,67 @@ DATASET_ORDER = ['SquaredKodak', 'SquaredIconsSample', 'SquaredAerialImages', 'S
 TRANSFORM_COLORS = {}
 DATASET_COLORS = {}
 
+# Figure/Axes reused by every plot drawn in this process (see _get_axes)
+_FIG = None
+_AX = None
 
-def generate_parametric_plot(df, transform_name="All"):
-    """Generates the parametric plot (Plot 1)."""
-    
-    # Filter data if a specific transform is requested
-    if transform_name != "All":
-        df = df[df['transform'] == transform_name].copy()
-        output_filename = f'plot_1_parametric_curve_{transform_name}.png'
+# Frames attached from shared memory by each plot worker, keyed like the jobs in generate_plots
+_WORKER_FRAMES = {}
+_WORKER_SEGMENTS = [] # Keeps the segments mapped for as long as the worker's frames are alive
+
+# Column types for the columns the plots use; other columns are left to inference
+CSV_DTYPES = {
+    'dataset': 'category',
+    'transform': 'category',
+    'compression_ratio': 'float32',
+    'psnr': 'float32',
+    'quantization_scale': 'float32',
+}
+
+
+def _get_axes():
+    """
+    Returns the process-wide (figure, axes) pair, cleared for a new plot.
+    Created on first use so it picks up the theme set by the worker initializer.
+    """
+    global _FIG, _AX
+    if _FIG is None:
+        _FIG, _AX = plt.subplots(figsize=GLOBAL_FIGSIZE)
     else:
-        output_filename = 'plot_1_parametric_curve_All.png'
+        _AX.clear()
+    return _FIG, _AX
 
+
+def _average_by_quant_scale(df):
+    """
+    Averages CR and PSNR per (dataset, transform, quantization_scale) for the parametric plots.
+    Computed once in generate_plots and shared by every parametric plot.
+    """
     # Group by all categorical variables AND the quantization_scale to trace the performance curve
-    avg_df = df.groupby(['dataset', 'transform', 'quantization_scale'], as_index=False).agg({
+    avg_df = df.groupby(['dataset', 'transform', 'quantization_scale'], as_index=False, observed=True).agg({
         'compression_ratio': 'mean',
         'psnr': 'mean'
     }).sort_values(by='quantization_scale') # Sort by quant scale to ensure lines connect logically
 
-    plt.figure(figsize=GLOBAL_FIGSIZE)
+    # lineplot splits lines with groupby(sort=False).get_group(), which hands back the wrong
+    # group for categorical keys on some pandas versions; plain labels keep the mapping right
+    return avg_df.astype({'dataset': str, 'transform': str})
+
+def generate_parametric_plot(avg_df, transform_name="All"):
+    """Generates the parametric plot (Plot 1) from the output of _average_by_quant_scale."""
+    
+    # Filter data if a specific transform is requested
+    if transform_name != "All":
+        avg_df = avg_df[avg_df['transform'] == transform_name]
+        output_filename = f'plot_1_parametric_curve_{transform_name}.png'
+    else:
+        output_filename = 'plot_1_parametric_curve_All.png'
+
+    fig, ax = _get_axes()
     
     # Use lineplot to connect the points for each (dataset, transform) group
     sns.lineplot(
+        ax=ax,
         data=avg_df,
         x='compression_ratio',
         y='psnr',
@@ -67,9 +112,8 @@ def generate_parametric_plot(df, transform_name="All"):
     # plt.tight_layout()
     
     save_path = os.path.join(OUTPUT_DIR, output_filename)
-    plt.savefig(save_path, dpi=DPI, bbox_inches='tight')
+    fig.savefig(save_path, dpi=DPI, bbox_inches='tight')
     print(f"Saved {output_filename}")
-    plt.close() # Close figure to free memory
 
 def generate_scatter_plot(df, transform_name="All"):
     """Generates the scatter plot (Plot 2)."""
@@ -81,8 +125,16 @@ def generate_scatter_plot(df, transform_name="All"):
     else:
         output_filename = 'plot_2_full_scatter_All.png'
 
-    plt.figure(figsize=GLOBAL_FIGSIZE)
+    # Randomly cap each (dataset, transform) group: past a few thousand points the
+    # alpha-blended markers are a solid blob, but Agg still draws every one of them.
+    # sort_index() keeps the original draw order, so groups under the cap are unchanged.
+    shuffled_df = df.sample(frac=1, random_state=0)
+    group_rank = shuffled_df.groupby(['dataset', 'transform'], observed=True).cumcount()
+    df = shuffled_df[group_rank < SCATTER_MAX_POINTS_PER_GROUP].sort_index()
+
+    fig, ax = _get_axes()
     sns.scatterplot(
+        ax=ax,
         data=df,
         x='compression_ratio',
         y='psnr',
@@ -106,9 +158,8 @@ def generate_scatter_plot(df, transform_name="All"):
     # plt.tight_layout()
 
     save_path = os.path.join(OUTPUT_DIR, output_filename)
-    plt.savefig(save_path, dpi=DPI, bbox_inches='tight')
+    fig.savefig(save_path, dpi=DPI, bbox_inches='tight')
     print(f"Saved {output_filename}")
-    plt.close() # Close figure to free memory
 
 def _filter_and_bin_data(df):
     """
@@ -116,7 +167,7 @@ def _filter_and_bin_data(df):
     Returns the filtered and binned DataFrame.
     """
     # 1. Filter Data to Intersection of Compression Ratio Ranges
-    cr_ranges = df.groupby('transform')['compression_ratio'].agg(['min', 'max'])
+    cr_ranges = df.groupby('transform', observed=True)['compression_ratio'].agg(['min', 'max'])
     global_cr_min = cr_ranges['min'].max()
     global_cr_max = cr_ranges['max'].min()
     
@@ -145,34 +196,23 @@ def _filter_and_bin_data(df):
     
     return filtered_df
 
-def generate_binned_boxplots(df):
+def generate_binned_boxplots(filtered_df):
     """
-    Generates Box Plots for PSNR distribution, binned by CR quantiles
-    after filtering to the CR intersection range.
+    Generates Box Plots for PSNR distribution, binned by CR quantiles.
+    Expects the output of _filter_and_bin_data (CR intersection range, with 'cr_bin').
     """
     print("\nGenerating Binned Box Plots (PSNR distribution per CR quantile bin)...")
-    
-    filtered_df = _filter_and_bin_data(df)
-    if filtered_df is None:
-        return # Stop if filtering failed
-
-    # Iterate through Bins and Plot
-    unique_bins = sorted(filtered_df['cr_bin'].unique(), key=lambda x: x.left)
-    
-    for cr_bin in unique_bins:
-        bin_df = filtered_df[filtered_df['cr_bin'] == cr_bin].copy()
-        
-        if bin_df.empty:
-            print(f"Skipping empty bin: {cr_bin}")
-            continue
 
+    # Iterate through Bins (in ascending CR order) and Plot
+    for cr_bin, bin_df in filtered_df.groupby('cr_bin', observed=True, sort=True):
         bin_str = f"({cr_bin.left:.2f} - {cr_bin.right:.2f}]"
         safe_bin_str = f"{cr_bin.left:.2f}_to_{cr_bin.right:.2f}"
         output_filename = f'plot_3_boxplot_CR_Bin_Quantile_Intersection_{safe_bin_str}.png'
         
-        plt.figure(figsize=GLOBAL_FIGSIZE)
+        fig, ax = _get_axes()
         
         sns.boxplot(
+            ax=ax,
             data=bin_df,
             x='dataset',
             order=DATASET_ORDER,
@@ -196,39 +236,27 @@ def generate_binned_boxplots(df):
         # plt.tight_layout()
         
         save_path = os.path.join(OUTPUT_DIR, output_filename)
-        plt.savefig(save_path, dpi=DPI, bbox_inches='tight')
+        fig.savefig(save_path, dpi=DPI, bbox_inches='tight')
         print(f"Saved {output_filename}")
-        plt.close()
 
-def generate_binned_bar_plots(df):
+def generate_binned_bar_plots(filtered_df):
     """
-    Generates Bar Plots for mean PSNR, binned by CR quantiles
-    after filtering to the CR intersection range.
+    Generates Bar Plots for mean PSNR, binned by CR quantiles.
+    Expects the output of _filter_and_bin_data (CR intersection range, with 'cr_bin').
     """
     print("\nGenerating Binned Bar Plots (Mean PSNR per CR quantile bin)...")
-    
-    filtered_df = _filter_and_bin_data(df)
-    if filtered_df is None:
-        return # Stop if filtering failed
 
-    # Iterate through Bins and Plot
-    unique_bins = sorted(filtered_df['cr_bin'].unique(), key=lambda x: x.left)
-    
-    for cr_bin in unique_bins:
-        bin_df = filtered_df[filtered_df['cr_bin'] == cr_bin].copy()
-        
-        if bin_df.empty:
-            print(f"Skipping empty bin: {cr_bin}")
-            continue
-            
+    # Iterate through Bins (in ascending CR order) and Plot
+    for cr_bin, bin_df in filtered_df.groupby('cr_bin', observed=True, sort=True):
         bin_str = f"({cr_bin.left:.2f} - {cr_bin.right:.2f}]"
         safe_bin_str = f"{cr_bin.left:.2f}_to_{cr_bin.right:.2f}"
         output_filename = f'plot_4_barplot_CR_Bin_Quantile_Intersection_{safe_bin_str}.png'
         
-        plt.figure(figsize=GLOBAL_FIGSIZE)
+        fig, ax = _get_axes()
         
         # Create the bar plot structure for Mean PSNR within this CR bin
         sns.barplot(
+            ax=ax,
             data=bin_df,
             x='dataset',
             order=DATASET_ORDER,
@@ -264,34 +292,116 @@ def generate_binned_bar_plots(df):
         # plt.tight_layout()
         
         save_path = os.path.join(OUTPUT_DIR, output_filename)
-        plt.savefig(save_path, dpi=DPI, bbox_inches='tight')
+        fig.savefig(save_path, dpi=DPI, bbox_inches='tight')
         print(f"Saved {output_filename}")
-        plt.close()
 
 
-def generate_plots(df):
-    """Generates all requested plots."""
+def _read_results_csv(path):
+    """
+    Reads the experiment CSV with the pyarrow parser (if installed) and the dtypes in CSV_DTYPES.
+    """
+    try:
+        return pd.read_csv(path, engine='pyarrow', dtype=CSV_DTYPES)
+    except ImportError:
+        # pyarrow is optional; the default C parser handles the same dtype mapping
+        return pd.read_csv(path, dtype=CSV_DTYPES)
+
+
+def _share_frame(df, segments):
+    """
+    Copies the numeric columns of df into new shared-memory segments (appended to segments)
+    and returns a picklable spec for _attach_frame. Categorical/label columns are small
+    (integer codes) and travel inside the spec.
+    """
+    spec = {'length': len(df), 'columns': list(df.columns), 'shared': {}, 'local': {}}
+    for col in df.columns:
+        values = df[col]
+        if not pd.api.types.is_numeric_dtype(values.dtype):
+            spec['local'][col] = values.array
+            continue
+        values = values.to_numpy()
+        shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        segments.append(shm)
+        np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf)[:] = values
+        spec['shared'][col] = (shm.name, values.dtype.str)
+    return spec
+
+def _attach_frame(spec):
+    """Rebuilds a frame shared by _share_frame; numeric columns are views on the shared segments."""
+    columns = {}
+    for col, (name, dtype) in spec['shared'].items():
+        shm = shared_memory.SharedMemory(name=name)
+        _WORKER_SEGMENTS.append(shm)
+        columns[col] = np.ndarray((spec['length'],), dtype=dtype, buffer=shm.buf)
+    columns.update(spec['local'])
+    return pd.DataFrame(columns, columns=spec['columns'], copy=False)
+
+def _init_plot_worker(transform_order, transform_colors, dataset_order, dataset_colors, frame_specs):
+    """
+    Initializer for plot worker processes. Copies the orders/palettes settled in main()
+    and applies the plot theme, since neither is inherited by spawned workers, then
+    attaches the shared input frames.
+    """
+    global TRANSFORM_ORDER, TRANSFORM_COLORS, DATASET_ORDER, DATASET_COLORS
+    TRANSFORM_ORDER, TRANSFORM_COLORS = transform_order, transform_colors
+    DATASET_ORDER, DATASET_COLORS = dataset_order, dataset_colors
+
     sns.set_theme(style="whitegrid")
     # Note: We are now using custom palettes defined in Configuration
     plt.style.use('ggplot')
 
-    # --- 1. Generate ALL-DATA plots first ---
+    for key, spec in frame_specs.items():
+        _WORKER_FRAMES[key] = _attach_frame(spec)
+
+def _run_plot_job(job):
+    """Runs one (plot function, frame key, args) job inside a worker process."""
+    plot_fn, frame_key, args = job
+    plot_fn(_WORKER_FRAMES[frame_key], *args)
+
+
+def generate_plots(df):
+    """Generates all requested plots, rendering independent figures in parallel."""
+    # Only the columns the plots read are handed to the workers
+    frames = {'data': df[['dataset', 'transform', 'compression_ratio', 'psnr']]}
+    jobs = []
+
+    # --- 1. ALL-DATA plots ---
     print("Generating 'All Transforms' plots...")
-    generate_parametric_plot(df, transform_name="All")
-    generate_scatter_plot(df, transform_name="All")
+    frames['averages'] = _average_by_quant_scale(df)
+    jobs.append((generate_parametric_plot, 'averages', ("All",)))
+    jobs.append((generate_scatter_plot, 'data', ("All",)))
     
-    # --- 2. Generate Binned Plots (Box and Bar) ---
-    # These functions have their own filtering and binning logic
-    generate_binned_boxplots(df) 
-    generate_binned_bar_plots(df)
+    # --- 2. Binned Plots (Box and Bar) ---
+    # Filter to the CR intersection and bin once; both plot types share the result
+    filtered_df = _filter_and_bin_data(df)
+    if filtered_df is not None:
+        frames['binned'] = filtered_df[['dataset', 'transform', 'psnr', 'cr_bin']]
+        jobs.append((generate_binned_boxplots, 'binned', ()))
+        jobs.append((generate_binned_bar_plots, 'binned', ()))
 
-    # --- 3. Generate PER-TRANSFORM plots ---
+    # --- 3. PER-TRANSFORM plots ---
     unique_transforms = df['transform'].unique()
     print(f"\nGenerating individual plots for transforms: {', '.join(unique_transforms)}...")
 
     for transform in unique_transforms:
-        generate_parametric_plot(df, transform_name=transform)
-        generate_scatter_plot(df, transform_name=transform)
+        jobs.append((generate_parametric_plot, 'averages', (transform,)))
+        jobs.append((generate_scatter_plot, 'data', (transform,)))
+
+    # Agg rendering and PNG encoding are CPU-bound and independent per figure.
+    # The input frames go to the workers once, through shared memory, instead of
+    # being pickled into every job.
+    segments = []
+    try:
+        frame_specs = {key: _share_frame(frame, segments) for key, frame in frames.items()}
+        init_args = (TRANSFORM_ORDER, TRANSFORM_COLORS, DATASET_ORDER, DATASET_COLORS, frame_specs)
+        max_workers = min(len(jobs), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_plot_worker, initargs=init_args) as executor:
+            # Consume the iterator so worker exceptions propagate here
+            list(executor.map(_run_plot_job, jobs))
+    finally:
+        for shm in segments:
+            shm.close()
+            shm.unlink()
     
     print("\nAll plots generated successfully.")
 
@@ -303,7 +413,7 @@ def main():
     
     # Attempt to load the user's data
     try:
-        df = pd.read_csv(FILE_PATH)
+        df = _read_results_csv(FILE_PATH)
         
         # Ensure categorical columns are present for grouping
         required_cols = ['dataset', 'transform', 'compression_ratio', 'psnr', 'quantization_scale']
@@ -359,6 +469,11 @@ def main():
         print(f"--- Using Transforms: {TRANSFORM_ORDER}")
         print(f"--- Using Datasets: {DATASET_ORDER}")
 
+        # --- Categorical Columns ---
+        # Groupby and seaborn then work on the integer codes instead of hashing strings
+        df['dataset'] = pd.Categorical(df['dataset'], categories=DATASET_ORDER)
+        df['transform'] = pd.Categorical(df['transform'], categories=TRANSFORM_ORDER)
+
         generate_plots(df)
 
     except (FileNotFoundError, ValueError) as e:
@@ -8,9 +8,11 @@ import os
 import subprocess
 import csv
 from pathlib import Path
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import count
 from typing import List, Tuple, Dict
 import re
+from run_experiments import available_cores, pin_worker
 
 # Configuration
 QUANTIZATION_SCALES = [i for i in range(1, 31, 2)]
@@ -25,13 +27,14 @@ def run_pipeline(transform: str, image_path: str, quant_scale: float, save_flag:
     Run simple_pipeline for a single image and transform.
     Returns a dict with the results.
     """
+    # close_fds=False lets subprocess launch the pipeline with posix_spawn
     subprocess.run(
         [EXECUTABLE, transform, image_path, str(quant_scale), save_flag],
         capture_output=False,
-        text=True,
+        close_fds=False,
         timeout=300  # 5 minute timeout per image
     )
-    
+
 def main():
     # Check if executable exists
     if not os.path.exists(EXECUTABLE):
@@ -50,25 +53,19 @@ def main():
     
     
     # Run tasks in parallel
-    results = []
     completed = 0
     
-    with ProcessPoolExecutor() as executor:
-        # Submit all tasks
-        future_to_task = {
-            executor.submit(run_pipeline, transform, image_path, quant_scale, save_flag): (transform, image_path, quant_scale, save_flag)
-            for transform, image_path, quant_scale, save_flag in tasks
-        }
-        
-        # Collect results as they complete
-        for future in as_completed(future_to_task):
-            transform, image_path, quant_scale, save_flag = future_to_task[future]
-            result = future.result()
-            results.append(result)
+    # One thread per usable core, each waiting on its own pipeline process
+    cores = available_cores()
+    
+    with ThreadPoolExecutor(max_workers=len(cores), initializer=pin_worker, initargs=(count(), cores)) as executor:
+        # One submission per task: idle workers pick up the next pending run
+        futures = [executor.submit(run_pipeline, transform, image_path, quant_scale, save_flag)
+                   for transform, image_path, quant_scale, save_flag in tasks]
+        for future in as_completed(futures):
+            future.result()
             completed += 1
-            
-            if completed % 10 == 0:
-                print(f"Progress: {completed}/{len(tasks)} tasks completed")
+            print(f"Progress: {completed}/{len(tasks)} tasks completed")
                     
     
     print(f"\nCompleted all {len(tasks)} tasks")
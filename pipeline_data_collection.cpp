@@ -2,10 +2,12 @@
 #include <string>
 #include <algorithm>
 #include <cctype>
+#include <cstdio>
 #include <cstdlib>
 #include <unistd.h>
 #include <filesystem>
 #include <fstream>
+#include <sstream>
 #include <vector>
 #include "utils/image_lib.hpp"
 #include "transforms/dct_transform.hpp"
@@ -20,26 +22,48 @@
 #include "utils/huffman.hpp"
 #include "utils/binary_io.hpp"
 
-int main(int argc, char* argv[]) {
-    if (argc < 4) {
-        std::cerr << "Usage: " << argv[0] << " <transform_name> <image_path> <quant_scale> <img_path>" << std::endl;
-        std::cerr << "Example: " << argv[0] << " DCT Datasets/SquaredKodak/1.png 2.0 1" << std::endl;
-        std::cerr << "\nAvailable transforms: DCT, SP, HAAR, DFT" << std::endl;
-        return 1;
+// Metrics produced by one run of the pipeline, in the order they are printed
+struct PipelineResult {
+    double compressionRatio;
+    double directCompressionRatio;
+    double originalEntropy;
+    double transformedEntropy;
+    double quantizedEntropy;
+    double mse;
+    double psnr;
+    double encodingTime;
+    double decodingTime;
+};
+
+// Create the transform for a (uppercase) transform name, or nullptr if it is unknown
+Transform* createTransform(const std::string& transformName) {
+    if (transformName == "DCT") {
+        return new DCTTransform();
+    } else if (transformName == "SP") {
+        return new SPTransform();
+    } else if (transformName == "HAAR") {
+        return new HaarTransform();
+    } else if (transformName == "DFT") {
+        return new DFTTransform();
     }
-    
-    std::string transformName = argv[1];
-    std::transform(transformName.begin(), transformName.end(), transformName.begin(), ::toupper);
-    std::string imagePath = argv[2];
-    double scale = std::strtod(argv[3], nullptr);
-    std::string outPath = argv[4];
-    
+    return nullptr;
+}
+
+// Output of the forward transform, which does not depend on the quantization scale
+struct TransformedImage {
+    ChunkedImage transformedImg;
+    double originalEntropy;
+    double transformedEntropy;
+    double transformTime;
+};
+
+// Run the forward transform on an already decoded image, so it can be reused for
+// every quantization scale instead of being recomputed per scale
+TransformedImage runTransform(const Image& originalImg, const std::string& transformName, Transform* transform) {
     // ============================================================================
     // ENCODING PIPELINE
     // ============================================================================
     
-    // Read PNG
-    Image originalImg(imagePath);
     double originalEntropy = originalImg.getEntropy();
     Image img(originalImg);
     
@@ -55,29 +79,27 @@ int main(int argc, char* argv[]) {
     img.convertToYCbCr();
     ChunkedImage chunkedImg(img, chunkSize);
     
-    // Create transform
-    Transform* transform = nullptr;
-    if (transformName == "DCT") {
-        transform = new DCTTransform();
-    } else if (transformName == "SP") {
-        transform = new SPTransform();
-    } else if (transformName == "HAAR") {
-        transform = new HaarTransform();
-    } else if (transformName == "DFT") {
-        transform = new DFTTransform();
-    } else {
-        std::cerr << "Error: Unknown transform " << transformName << std::endl;
-        return 1;
-    }
-    
-    // Measure encoding time
-    cscomps::util::Timer encodeTimer;
+    // Measure transform time (counted as part of every scale's encoding time)
+    cscomps::util::Timer transformTimer;
     
     // Apply transform
     ChunkedImage transformedImg = chunkedImg.createFreshCopyForTransformResult(transform->getTransformSpace());
     transformedImg = transform->applyTransform(chunkedImg);
     double transformedEntropy = Image(transformedImg).getEntropy();
     
+    double transformTime = transformTimer.elapsed_ms();
+    
+    return {transformedImg, originalEntropy, transformedEntropy, transformTime};
+}
+
+// Run the rest of the encode/decode pipeline for one quantization scale
+PipelineResult runPipeline(const Image& originalImg, const std::string& transformName, Transform* transform,
+                           const TransformedImage& transformed, double scale, const std::string& outPath) {
+    const ChunkedImage& transformedImg = transformed.transformedImg;
+    
+    // Measure encoding time
+    cscomps::util::Timer encodeTimer;
+    
     // Apply quantization
     ChunkedImage quantizedImg = transformedImg;
     quantizedImg = transform->applyQuantization(transformedImg, scale);
@@ -123,7 +145,7 @@ int main(int argc, char* argv[]) {
     // Calculate compression ratio
     double compressionRatio = static_cast<double>(originalSizeBytes) / static_cast<double>(compressedSizeBytes);
     
-    double encodingTime = encodeTimer.elapsed_ms();
+    double encodingTime = transformed.transformTime + encodeTimer.elapsed_ms();
     
     // ============================================================================
     // DECODING PIPELINE (reverse order)
@@ -171,18 +193,68 @@ int main(int argc, char* argv[]) {
     std::filesystem::remove(tempFile);
     std::filesystem::remove(directTempFile);
     
-    // Output exactly in the specified format: (compression ratio, direct compression ratio, original entropy, transformed entropy, quantized entropy, mse, psnr, encoding time, decoding time)
-    std::cout << "(" 
-              << compressionRatio << ", "
-              << directCompressionRatio << ", "
-              << originalEntropy << ", "
-              << transformedEntropy << ", "
-              << quantizedEntropy << ", "
-              << mse << ", "
-              << psnr << ", "
-              << encodingTime << ", "
-              << decodingTime << ")"
-              << std::endl;
+    return {compressionRatio, directCompressionRatio, transformed.originalEntropy, transformed.transformedEntropy, quantizedEntropy,
+            mse, psnr, encodingTime, decodingTime};
+}
+
+int main(int argc, char* argv[]) {
+    if (argc < 5) {
+        std::cerr << "Usage: " << argv[0] << " <transform_name> <image_path> <quant_scale[,quant_scale...]> <img_path> [--binary]" << std::endl;
+        std::cerr << "Example: " << argv[0] << " DCT Datasets/SquaredKodak/1.png 2.0 1" << std::endl;
+        std::cerr << "         " << argv[0] << " DCT Datasets/SquaredKodak/1.png 0.5,1.0,2.0 no_save" << std::endl;
+        std::cerr << "\nAvailable transforms: DCT, SP, HAAR, DFT" << std::endl;
+        return 1;
+    }
+    
+    std::string transformName = argv[1];
+    std::transform(transformName.begin(), transformName.end(), transformName.begin(), ::toupper);
+    std::string imagePath = argv[2];
+    // A comma-separated list of scales runs the transform once and prints one line per scale
+    std::vector<double> scales;
+    std::stringstream scaleList(argv[3]);
+    std::string scaleStr;
+    while (std::getline(scaleList, scaleStr, ',')) {
+        scales.push_back(std::strtod(scaleStr.c_str(), nullptr));
+    }
+    std::string outPath = argv[4];
+    // --binary writes each result as 9 raw doubles (native byte order) instead of a text tuple
+    bool binaryOutput = argc > 5 && std::string(argv[5]) == "--binary";
+    
+    // Create transform
+    Transform* transform = createTransform(transformName);
+    if (transform == nullptr) {
+        std::cerr << "Error: Unknown transform " << transformName << std::endl;
+        return 1;
+    }
+    
+    // Read PNG
+    Image originalImg(imagePath);
+    TransformedImage transformed = runTransform(originalImg, transformName, transform);
+    
+    for (double scale : scales) {
+        PipelineResult result = runPipeline(originalImg, transformName, transform, transformed, scale, outPath);
+        
+        if (binaryOutput) {
+            double record[] = {result.compressionRatio, result.directCompressionRatio, result.originalEntropy,
+                               result.transformedEntropy, result.quantizedEntropy, result.mse, result.psnr,
+                               result.encodingTime, result.decodingTime};
+            std::fwrite(record, sizeof(double), sizeof(record) / sizeof(double), stdout);
+            continue;
+        }
+        
+        // Output exactly in the specified format: (compression ratio, direct compression ratio, original entropy, transformed entropy, quantized entropy, mse, psnr, encoding time, decoding time)
+        std::cout << "(" 
+                  << result.compressionRatio << ", "
+                  << result.directCompressionRatio << ", "
+                  << result.originalEntropy << ", "
+                  << result.transformedEntropy << ", "
+                  << result.quantizedEntropy << ", "
+                  << result.mse << ", "
+                  << result.psnr << ", "
+                  << result.encodingTime << ", "
+                  << result.decodingTime << ")"
+                  << std::endl;
+    }
     
     delete transform;
     
@@ -7,10 +7,11 @@ on all datasets with chunk size 512, in parallel.
 import os
 import subprocess
 import csv
-from pathlib import Path
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from typing import List, Tuple, Dict
-import re
+import struct
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from itertools import count
+from typing import Callable, Iterable, Iterator, List, Tuple, Dict
 import random
 # from wakepy import keep
 
@@ -26,102 +27,166 @@ DATASETS_DIR = "Datasets"
 EXECUTABLE = "./pipeline_data_collection"
 RESULTS_DIR = "results"
 
+# Columns of the results CSV, in order
+FIELDNAMES = [
+    "transform",
+    "dataset",
+    "image_path",
+    "mse",
+    "psnr",
+    "compression_ratio",
+    "direct_compression_ratio",
+    "original_entropy",
+    "transformed_entropy",
+    "quantized_entropy",
+    "quantization_scale",
+    "encode_ms",
+    "decode_ms",
+    "error"
+]
+
 def find_all_images() -> List[Tuple[str, str]]:
     """
     Find PNG images in all dataset subdirectories, sampling 25 images per dataset.
     Returns list of (dataset_name, image_path) tuples.
     """
     images = []
-    datasets_path = Path(DATASETS_DIR)
     
-    if not datasets_path.exists():
+    if not os.path.isdir(DATASETS_DIR):
         print(f"Error: {DATASETS_DIR} directory not found")
         return images
     
-    for dataset_dir in datasets_path.iterdir():
-        if dataset_dir.is_dir():
-            dataset_name = dataset_dir.name
-            dataset_images = []
-            
-            for image_file in dataset_dir.glob("*.png"):
-                image_path = str(image_file)
-                match = re.search(r"[\d]+.png", image_path)
-                if match:
-                    num = int(match.group()[:-4])
-                dataset_images.append((dataset_name, image_path))
-            
-            # Sample 25 images from this dataset (or all if less than 25)
-            if len(dataset_images) > 25:
-                sampled = random.sample(dataset_images, 25)
-                images.extend(sorted(sampled))
-                print(f"Sampled 25 images from {dataset_name} (out of {len(dataset_images)} total)")
-            else:
-                images.extend(sorted(dataset_images))
-                print(f"Using all {len(dataset_images)} images from {dataset_name}")
-    
-    return sorted(images)
-
-def parse_output(output: str) -> Tuple[float, float, float, float, float, float, float, float, float]:
+    # os.scandir yields names and file types straight from the directory listing,
+    # without a stat call or Path object per entry
+    with os.scandir(DATASETS_DIR) as dataset_dirs:
+        # Visiting datasets in name order keeps the per-dataset sorted runs globally sorted
+        for dataset_dir in sorted(dataset_dirs, key=lambda entry: entry.name):
+            if dataset_dir.is_dir():
+                dataset_name = dataset_dir.name
+                dataset_images = []
+                
+                with os.scandir(dataset_dir.path) as image_files:
+                    for image_file in image_files:
+                        if not image_file.name.endswith(".png"):
+                            continue
+                        dataset_images.append((dataset_name, image_file.path))
+                
+                # Sample 25 images from this dataset (or all if less than 25)
+                if len(dataset_images) > 25:
+                    sampled = random.sample(dataset_images, 25)
+                    images.extend(sorted(sampled))
+                    print(f"Sampled 25 images from {dataset_name} (out of {len(dataset_images)} total)")
+                else:
+                    images.extend(sorted(dataset_images))
+                    print(f"Using all {len(dataset_images)} images from {dataset_name}")
+    
+    return images
+
+# One result record as written by pipeline_data_collection --binary
+_RESULT_RECORD = struct.Struct("=9d")
+
+def parse_output(output: bytes) -> List[Tuple[float, float, float, float, float, float, float, float, float]]:
+    """
+    Parse the binary output from pipeline_data_collection --binary.
+    Expected format: one record of 9 native-endian doubles per quantization scale, each (compression_ratio, direct_compression_ratio, original_entropy, transformed_entropy, quantized_entropy, mse, psnr, encoding_time, decoding_time)
+    Returns: one (compression_ratio, direct_compression_ratio, original_entropy, transformed_entropy, quantized_entropy, mse, psnr, encoding_time, decoding_time) tuple per record
+    """
+
+    return list(_RESULT_RECORD.iter_unpack(output))
+
+def available_cores() -> List[int]:
+    """
+    Cores this process may run on (all of them where CPU affinity is unsupported).
     """
-    Parse the output from pipeline_data_collection.
-    Expected format: (compression_ratio, direct_compression_ratio, original_entropy, transformed_entropy, quantized_entropy, mse, psnr, encoding_time, decoding_time)
-    Returns: (compression_ratio, direct_compression_ratio, original_entropy, transformed_entropy, quantized_entropy, mse, psnr, encoding_time, decoding_time)
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def pin_worker(next_core: Iterator[int], cores: List[int]) -> None:
     """
+    Pool initializer: pin each worker thread, and so every pipeline process it spawns, to its own core.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return
+    # On Linux, pid 0 targets the calling thread rather than the whole process
+    os.sched_setaffinity(0, {cores[next(next_core) % len(cores)]})
+
+# Result of a failed run: every metric is None
+_ERROR_RESULT = dict.fromkeys(FIELDNAMES)
 
-    compression_ratio, direct_compression_ratio, original_entropy, transformed_entropy, quantized_entropy, mse, psnr, encoding_time, decoding_time = map(float, output.strip()[1:-1].split(','))
-    return (compression_ratio, direct_compression_ratio, original_entropy, transformed_entropy, quantized_entropy, mse, psnr, encoding_time, decoding_time)
+# Values of a result dict in FIELDNAMES order (every result dict has all of FIELDNAMES)
+_row_values = itemgetter(*FIELDNAMES)
 
-def run_pipeline(transform: str, image_path: str, quant_scale: float, save_flag: str) -> Dict:
+def run_pipeline(transform: str, dataset_name: str, image_path: str, quant_scales: List[float], save_flag: str) -> List[Dict]:
     """
-    Run simple_pipeline for a single image and transform.
-    Returns a dict with the results.
+    Run simple_pipeline for a single image of dataset_name and transform over all the given quantization scales.
+    The image is decoded and transformed once, then quantized and coded at each scale.
+    Returns a list with one result dict per scale, in the order of quant_scales.
     """
+    # close_fds=False keeps the launch on subprocess's posix_spawn path
     result = subprocess.run(
-        [EXECUTABLE, transform, image_path, str(quant_scale), save_flag],
+        [EXECUTABLE, transform, image_path, ",".join(str(quant_scale) for quant_scale in quant_scales), save_flag, "--binary"],
         capture_output=True,
-        text=True,
-        timeout=300  # 5 minute timeout per image
+        close_fds=False,
+        timeout=300 * len(quant_scales)  # 5 minute timeout per image and scale
     )
     
     if result.returncode != 0:
-        error_msg = result.stderr.strip()
+        error_msg = result.stderr.decode(errors="replace").strip()
         print(f"Error running {transform} on {image_path}: {error_msg}")
-        return {
-            "dataset": Path(image_path).parent.name,
+        return [{
+            **_ERROR_RESULT,
+            "dataset": dataset_name,
             "image_path": image_path,
             "transform": transform,
-            "mse": None,
-            "psnr": None,
-            "original_entropy": None,
-            "transformed_entropy": None,
-            "quantized_entropy": None,
             "quantization_scale": quant_scale,
-            "decode_ms": None,
-            "encode_ms": None,
-            "compression_ratio": None,
-            "direct_compression_ratio": None,
             "error": error_msg
-        }
-    
-    output = result.stdout.strip()
-    (compression_ratio, direct_compression_ratio, original_entropy, transformed_entropy, quantized_entropy, mse, psnr, encoding_time, decoding_time) = parse_output(output)
-
-    return {
-        "dataset": Path(image_path).parent.name,
-        "image_path": image_path,
-        "transform": transform,
-        "mse": mse,
-        "psnr": psnr,
-        "compression_ratio": compression_ratio,
-        "direct_compression_ratio": direct_compression_ratio,
-        "original_entropy": original_entropy,
-        "transformed_entropy": transformed_entropy,
-        "quantized_entropy": quantized_entropy,
-        "quantization_scale": quant_scale,
-        "encode_ms": encoding_time,
-        "decode_ms": decoding_time,
-        "error": None
-    }
+        } for quant_scale in quant_scales]
+    
+    results = []
+    for quant_scale, output in zip(quant_scales, parse_output(result.stdout)):
+        (compression_ratio, direct_compression_ratio, original_entropy, transformed_entropy, quantized_entropy, mse, psnr, encoding_time, decoding_time) = output
+        results.append({
+            "dataset": dataset_name,
+            "image_path": image_path,
+            "transform": transform,
+            "mse": mse,
+            "psnr": psnr,
+            "compression_ratio": compression_ratio,
+            "direct_compression_ratio": direct_compression_ratio,
+            "original_entropy": original_entropy,
+            "transformed_entropy": transformed_entropy,
+            "quantized_entropy": quantized_entropy,
+            "quantization_scale": quant_scale,
+            "encode_ms": encoding_time,
+            "decode_ms": decoding_time,
+            "error": None
+        })
+    return results
+
+def _imap_unordered(executor: ThreadPoolExecutor, fn: Callable, tasks: Iterable, window: int) -> Iterator:
+    """
+    Run fn over tasks on the executor, keeping at most window tasks submitted at a time.
+    Idle workers pull the next pending task, so no worker is tied to a fixed share of the tasks.
+    Yields each result as its task completes, in completion order.
+    """
+    pending = set()
+    for task in tasks:
+        if len(pending) >= window:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+        pending.add(executor.submit(fn, task))
+    for future in as_completed(pending):
+        yield future.result()
+
+def run_pipeline_task(task: Tuple[str, str, str, List[float], str]) -> List[Dict]:
+    """
+    Run simple_pipeline for one (transform, dataset_name, image_path, quant_scales, save_flag) task.
+    Returns the result dicts from run_pipeline.
+    """
+    transform, dataset_name, image_path, quant_scales, save_flag = task
+    return run_pipeline(transform, dataset_name, image_path, quant_scales, save_flag)
 
 def main():
     # Check if executable exists
@@ -140,73 +205,67 @@ def main():
         print("No images found. Exiting.")
         return 1
     
-    # Prepare all tasks
+    # Prepare all tasks: one per (transform, image), covering every scale of that transform.
+    # An image's transforms are kept next to each other so its PNG is still in the page cache
     tasks = []
-    for transform in TRANSFORMS:
-        for dataset_name, image_path in images:
-            for quant_scale in QUANTIZATION_SCALES[transform]:
-                tasks.append((transform, dataset_name, image_path, quant_scale, "no_save"))
+    for dataset_name, image_path in images:
+        for transform in TRANSFORMS:
+            tasks.append((transform, dataset_name, image_path, QUANTIZATION_SCALES[transform], "no_save"))
+    total_runs = sum(len(task[3]) for task in tasks)
+
+    # Largest images first: their long runs start early and the short ones fill in the tail.
+    # The sort is stable, so images of equal size keep their transforms together
+    image_sizes = {image_path: os.path.getsize(image_path) for _, image_path in images}
+    tasks.sort(key=lambda task: image_sizes[task[2]], reverse=True)
+
+    print(f"Total tasks: {len(tasks)} ({len(TRANSFORMS)} transforms × {len(images)} images), {total_runs} pipeline runs")
     
-    print(f"Total tasks: {len(tasks)} ({len(TRANSFORMS)} transforms × {len(images)} images)")
+    # Write results to CSV files
+    csv_filename = os.path.join(RESULTS_DIR, "extended_experiment_results.csv")
     
     # Run tasks in parallel
-    results = []
     completed = 0
+    written = 0
+    
+    # Threads suffice: each worker only waits on its pipeline process, one per usable core
+    cores = available_cores()
     
-    with ProcessPoolExecutor() as executor:
-        # Submit all tasks
-        future_to_task = {
-            executor.submit(run_pipeline, transform, image_path, quant_scale, save_flag): (transform, dataset_name, image_path, quant_scale, save_flag)
-            for transform, dataset_name, image_path, quant_scale, save_flag in tasks
-        }
+    # Rows are streamed to the CSV as tasks complete, so memory stays flat and a crash
+    # keeps every result finished so far
+    with open(csv_filename, 'w', newline='') as csvfile, \
+         ThreadPoolExecutor(max_workers=len(cores), initializer=pin_worker, initargs=(count(), cores)) as executor:
+        # A plain csv.writer over field-ordered tuples avoids DictWriter's per-row dict handling
+        writer = csv.writer(csvfile)
+        writer.writerow(FIELDNAMES)
         
-        # Collect results as they complete
-        for future in as_completed(future_to_task):
-            transform, dataset_name, image_path, quant_scale, save_flag = future_to_task[future]
-            result = future.result()
-            results.append(result)
+        # Only a couple of tasks per worker are queued at once; results come back in
+        # completion order, and rows are sorted after the run anyway
+        for task_results in _imap_unordered(executor, run_pipeline_task, tasks, window=2 * len(cores)):
+            writer.writerows(map(_row_values, task_results))
+            written += len(task_results)
+            csvfile.flush()
             completed += 1
             
-            if completed % 10 == 0:
-                print(f"Progress: {completed}/{len(tasks)} tasks completed")
+            print(f"Progress: {completed}/{len(tasks)} tasks completed")
                     
     
     print(f"\nCompleted all {len(tasks)} tasks")
     
-    # Write results to CSV files
-    csv_filename = os.path.join(RESULTS_DIR, "extended_experiment_results.csv")
-    results = sorted(results, 
-                    key=lambda x: (x["dataset"], x["image_path"], x["transform"]))
-    
-    # Remove 'transform' field from results as it's redundant (file name indicates transform)
-    fieldnames = [
-                    "transform", 
-                    "dataset", 
-                    "image_path", 
-                    "mse", 
-                    "psnr",
-                    "compression_ratio",
-                    "direct_compression_ratio",
-                    "original_entropy",
-                    "transformed_entropy",
-                    "quantized_entropy",
-                    "quantization_scale",
-                    "encode_ms", 
-                    "decode_ms",
-                    "error"
-                  ]
-    # Ensure keys exist for all rows (use None when missing)
-    csv_results = []
-    for row in results:
-        out = {k: row.get(k, None) for k in fieldnames}
-        csv_results.append(out)
-    
-    with open(csv_filename, 'w', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(csv_results)
-    
-    print(f"Written {len(results)} results to {csv_filename}")
+    # Rows were written in completion order: sort them once the run has finished
+    sort_key = itemgetter(*(FIELDNAMES.index(k) for k in ("dataset", "image_path", "transform")))
+    with open(csv_filename, newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader)  # header
+        rows = sorted(reader, key=sort_key)
+    
+    sorted_filename = csv_filename + ".sorting"
+    with open(sorted_filename, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(FIELDNAMES)
+        writer.writerows(rows)
+    os.replace(sorted_filename, csv_filename)
+    
+    print(f"Written {written} results to {csv_filename}")
     
     print("\nAll results written to CSV files in the results/ directory")
     return 0